@@ -1,6 +1,7 @@
 import os
+import time
 from openai import OpenAI
-from app.lifespan import kb
+from app.lifespan import kb, shadow
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None
 
@@ -64,7 +65,9 @@ def answer_with_ai_or_fallback(question: str) -> str:
     - If no API key: still works in demo mode using KB context; otherwise returns a safe fallback.
     """
     question = (question or "").strip()
+    start = time.perf_counter()
     context = kb.retrieve_context_keyword(question)
+    shadow.submit(question, time.perf_counter() - start)
 
     # No OpenAI key: run in deterministic demo mode.
     if not client:
@@ -0,0 +1,442 @@
+"""
+Pre-built answer cache for frequent question shapes.
+
+Offline, `python -m app.answer_cache LOG.jsonl` streams logged questions
+in chunks, embeds them as hashed character n-grams and clusters them with
+mini-batch k-means in bounded memory. The question nearest each centroid is
+answered once with answer_with_ai_or_fallback() and saved; the webhook then
+serves those answers directly for near-identical questions.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "kb/answer_cache.npz")
+# Minimum cosine similarity between a question and a cached representative to serve its answer.
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9"))
+
+# Words that may differ between a question and its cached representative; any other
+# differing word (e.g. "no", "not", a different place) means a different question.
+FILLER_WORDS = {
+    "a", "an", "the", "please", "pls", "plz", "thanks", "thank", "you", "thx", "hi", "hello", "hey",
+    "salam", "salaam", "assalamualaikum", "ok", "okay",
+}
+
+HASH_BITS = 12
+NGRAM_SIZES = (3, 4)
+_HASH_MULT = np.uint64(0x9E3779B97F4A7C15)
+
+
+def vectorize(texts, hash_bits=HASH_BITS):
+    """
+    Embeds texts as L2-normalised hashed character n-gram counts.
+
+    All n-grams of a batch are extracted and hashed in one pass over the
+    concatenated bytes, so the cost per chunk is a handful of array ops.
+
+    Args:
+        texts (list): Question strings.
+        hash_bits (int): Vector size is 2**hash_bits (default: HASH_BITS).
+
+    Returns:
+        np.ndarray: float32 array of shape (len(texts), 2**hash_bits).
+    """
+    dim = 1 << hash_bits
+    X = np.zeros((len(texts), dim), dtype=np.float32)
+    if not texts:
+        return X
+
+    # Lowercase alphanumeric words padded with spaces; NUL separates documents.
+    normalized = [" " + " ".join(re.findall(r"[a-z0-9]+", (t or "").lower())) + " " for t in texts]
+    data = np.frombuffer("\0".join(normalized).encode("ascii"), dtype=np.uint8)
+    doc_ids = np.cumsum(data == 0)
+
+    for n in NGRAM_SIZES:
+        if len(data) < n:
+            continue
+        windows = sliding_window_view(data, n)
+        valid = (windows != 0).all(axis=1)
+        codes = np.zeros(len(windows), dtype=np.uint64)
+        for j in range(n):
+            codes |= windows[:, j].astype(np.uint64) << np.uint64(8 * j)
+        buckets = (codes * _HASH_MULT) >> np.uint64(64 - hash_bits)
+        np.add.at(X, (doc_ids[: len(windows)][valid], buckets[valid].astype(np.intp)), 1)
+
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    np.divide(X, norms, out=X, where=norms > 0)
+    return X
+
+
+def content_words(text: str) -> frozenset:
+    """
+    Lowercase alphanumeric words of a question, minus FILLER_WORDS.
+    """
+    return frozenset(re.findall(r"[a-z0-9]+", (text or "").lower())) - FILLER_WORDS
+
+
+def kb_fingerprint(kb_text: str) -> str:
+    """
+    Hash of the KB text a cache was built against; a cache is only served with the same KB.
+    """
+    return hashlib.sha256(kb_text.encode("utf-8")).hexdigest()
+
+
+class MiniBatchKMeans:
+    """
+    Spherical mini-batch k-means (cosine similarity) with per-centre learning rates.
+
+    Memory is k x dim for the centres regardless of how much traffic is streamed.
+    """
+
+    def __init__(self, k, seed=0):
+        self.k = k
+        self.centers = None
+        self.counts = None
+        self.rng = np.random.default_rng(seed)
+        # Rows held back until at least k have arrived, so the chunk size never caps k.
+        self._pending = []
+
+    def _init_centers(self, X):
+        """
+        Seeds centres with k-means++ on cosine distance.
+        """
+        k = min(self.k, len(X))
+        idx = [int(self.rng.integers(len(X)))]
+        dist = 1 - X @ X[idx[0]]
+        for _ in range(1, k):
+            p = np.clip(dist, 0, None)
+            if p.sum() == 0:
+                break
+            i = int(self.rng.choice(len(X), p=p / p.sum()))
+            idx.append(i)
+            dist = np.minimum(dist, 1 - X @ X[i])
+        self.centers = X[idx].copy()
+        self.counts = np.zeros(len(idx), dtype=np.int64)
+
+    def predict(self, X):
+        """
+        Assigns rows to their most similar centre.
+
+        Args:
+            X (np.ndarray): Normalised vectors.
+
+        Returns:
+            tuple: (labels, similarities) arrays of length len(X).
+        """
+        sims = X @ self.centers.T
+        labels = sims.argmax(axis=1)
+        return labels, sims[np.arange(len(X)), labels]
+
+    def partial_fit(self, X):
+        """
+        Updates the centres with one batch; each centre moves towards the mean of its
+        new members with step size new_members / total_members.
+
+        Args:
+            X (np.ndarray): Normalised vectors.
+        """
+        # Rows with no ASCII n-grams (empty, emoji, non-Latin script) carry no signal.
+        X = X[np.linalg.norm(X, axis=1) > 0]
+        if not len(X):
+            return
+        if self.centers is None:
+            self._pending.append(X)
+            if sum(len(b) for b in self._pending) < self.k:
+                return
+            self.flush()
+            return
+        self._update(X)
+
+    def flush(self):
+        """
+        Seeds and fits the centres from held-back rows; call once the stream ends
+        in case it held fewer than k usable rows in total.
+        """
+        if self.centers is not None or not self._pending:
+            return
+        X = np.concatenate(self._pending)
+        self._pending = []
+        self._init_centers(X)
+        self._update(X)
+
+    def _update(self, X):
+        labels, _ = self.predict(X)
+        batch_counts = np.bincount(labels, minlength=len(self.centers))
+        sums = np.zeros_like(self.centers)
+        np.add.at(sums, labels, X)
+        self.counts += batch_counts
+        hit = batch_counts > 0
+        self.centers[hit] += (sums[hit] - batch_counts[hit, None] * self.centers[hit]) / self.counts[hit, None]
+        norms = np.linalg.norm(self.centers, axis=1, keepdims=True)
+        np.divide(self.centers, norms, out=self.centers, where=norms > 0)
+
+
+class AnswerCache:
+    """
+    Serves pre-built answers for questions close to a cached representative.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD):
+        self.threshold = threshold
+        self.vectors = None
+        self.questions = []
+        self.answers = []
+        self.words = []
+        self.kb_hash = ""
+
+    def load(self, path=ANSWER_CACHE_PATH, kb_text=None):
+        """
+        Loads a cache written by build_answer_cache().
+
+        Args:
+            path (str): Path to the .npz file (default: ANSWER_CACHE_PATH).
+            kb_text (str): Current KB text; if given and the cache was built against
+                different KB text, the cache is stale and is not loaded.
+
+        Returns:
+            bool: True if loaded, False if skipped as stale.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Answer cache not found: {path}")
+        with np.load(path, allow_pickle=False) as data:
+            kb_hash = str(data["kb_hash"]) if "kb_hash" in data else ""
+            if kb_text is not None and kb_hash != kb_fingerprint(kb_text):
+                return False
+            self.vectors = data["vectors"]
+            self.questions = data["questions"].tolist()
+            self.answers = data["answers"].tolist()
+        self.words = [content_words(q) for q in self.questions]
+        self.kb_hash = kb_hash
+        return True
+
+    def save(self, path=ANSWER_CACHE_PATH):
+        """
+        Writes the cache as a compressed .npz file.
+        """
+        np.savez_compressed(
+            path,
+            vectors=self.vectors,
+            questions=np.array(self.questions, dtype=str),
+            answers=np.array(self.answers, dtype=str),
+            kb_hash=np.array(self.kb_hash),
+        )
+
+    def match(self, question: str, vector=None):
+        """
+        Index of the cached question this one may be answered with, or None.
+
+        The n-gram similarity must reach the threshold and the two questions must
+        have the same content words, so "is there no parking" never matches
+        "is there parking".
+        """
+        if vector is None:
+            vector = vectorize([question])[0]
+        sims = self.vectors @ vector
+        words = content_words(question)
+        for i in np.argsort(-sims):
+            if sims[i] < self.threshold:
+                break
+            if self.words[i] == words:
+                return int(i)
+        return None
+
+    def lookup(self, question: str):
+        """
+        Returns the cached answer for a question, if one is similar enough.
+
+        Args:
+            question (str): Incoming question.
+
+        Returns:
+            str | None: Cached answer, or None on a miss or an empty cache.
+        """
+        if self.vectors is None or not len(self.vectors):
+            return None
+        i = self.match(question)
+        return None if i is None else self.answers[i]
+
+
+def stream_questions(path, field="body", chunk_size=2048):
+    """
+    Yields lists of questions from a JSONL log, chunk_size at a time.
+
+    Prayer-time questions are skipped since the shortcuts answer them without the LLM.
+
+    Args:
+        path (str): JSONL file with one logged request per line.
+        field (str): Key holding the question text (default: "body").
+        chunk_size (int): Questions per chunk (default: 2048).
+    """
+    from app.prayers import check_prayer_time_shortcuts
+
+    chunk = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            question = (json.loads(line).get(field) or "").strip()
+            if not question or check_prayer_time_shortcuts(question):
+                continue
+            chunk.append(question)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def build_answer_cache(
+    path, k=300, field="body", chunk_size=2048, threshold=ANSWER_CACHE_THRESHOLD, seed=0, answer=True
+):
+    """
+    Clusters a question log and answers one representative per cluster.
+
+    Streams the log three times: fit the centres, pick each cluster's most central
+    question, then measure how much traffic the cache would actually serve.
+    Representatives that only get the no-context fallback reply, or whose answer call
+    fails, are not cached.
+
+    Args:
+        path (str): JSONL question log.
+        k (int): Number of clusters (default: 300).
+        field (str): Key holding the question text (default: "body").
+        chunk_size (int): Questions per chunk (default: 2048).
+        threshold (float): Similarity needed to serve a cached answer.
+        seed (int): Random seed for centre initialisation (default: 0).
+        answer (bool): If False, skip the answering calls and leave answers empty (default: True).
+
+    Returns:
+        tuple: (AnswerCache, report dict).
+
+    Raises:
+        ValueError: If the log contains no LLM-bound questions.
+        RuntimeError: If answering is requested without an OpenAI key, since demo-mode
+            and fallback replies must not be served as real answers.
+    """
+    from app import ai
+    from app.lifespan import kb
+
+    if answer and ai.client is None:
+        raise RuntimeError("OPENAI_API_KEY is not set; refusing to cache demo-mode answers.")
+
+    model = MiniBatchKMeans(k, seed=seed)
+    for chunk in stream_questions(path, field, chunk_size):
+        model.partial_fit(vectorize(chunk))
+    model.flush()
+    if model.centers is None:
+        raise ValueError(f"No LLM-bound questions found in {path}")
+
+    n_clusters = len(model.centers)
+    sizes = np.zeros(n_clusters, dtype=np.int64)
+    best_sim = np.full(n_clusters, -1.0)
+    reps = [""] * n_clusters
+    rep_vectors = np.zeros_like(model.centers)
+    for chunk in stream_questions(path, field, chunk_size):
+        X = vectorize(chunk)
+        nonzero = np.flatnonzero(np.linalg.norm(X, axis=1) > 0)
+        chunk, X = [chunk[i] for i in nonzero], X[nonzero]
+        labels, sims = model.predict(X)
+        sizes += np.bincount(labels, minlength=n_clusters)
+        for i in np.flatnonzero(sims > best_sim[labels]):
+            c = labels[i]
+            if sims[i] > best_sim[c]:
+                best_sim[c], reps[c], rep_vectors[c] = sims[i], chunk[i], X[i]
+
+    clusters = np.flatnonzero(sizes > 0)
+    answers, failed = [], 0
+    for c in clusters:
+        try:
+            answers.append(ai.answer_with_ai_or_fallback(reps[c]) if answer else "")
+        except Exception:
+            # Rate limits, timeouts or 5xx after the SDK's retries: skip this cluster
+            # and keep every answer already paid for.
+            answers.append(None)
+            failed += 1
+    keep = [i for i, a in enumerate(answers) if a is not None and a != ai.FALLBACK_NO_CONTEXT]
+
+    cache = AnswerCache(threshold)
+    cache.vectors = rep_vectors[clusters[keep]]
+    cache.questions = [reps[clusters[i]] for i in keep]
+    cache.answers = [answers[i] for i in keep]
+    cache.words = [content_words(q) for q in cache.questions]
+    cache.kb_hash = kb_fingerprint(kb.kb_text)
+
+    total = served = 0
+    for chunk in stream_questions(path, field, chunk_size):
+        X = vectorize(chunk)
+        total += len(chunk)
+        if len(cache.questions):
+            served += sum(cache.match(q, x) is not None for q, x in zip(chunk, X))
+
+    order = np.argsort(sizes[clusters])[::-1]
+    report = {
+        "questions": total,
+        "clusters": len(clusters),
+        "cached": len(keep),
+        "failed": failed,
+        "top_clusters": [
+            {"size": int(sizes[clusters[i]]), "share": sizes[clusters[i]] / total, "representative": reps[clusters[i]]}
+            for i in order
+        ],
+        "served_from_cache": served,
+        "llm_calls_avoided": max(served - len(clusters), 0),
+    }
+    return cache, report
+
+
+def format_report(report, top=20):
+    """
+    Renders a build report as plain text.
+    """
+    total = report["questions"]
+    lines = [f"{total} LLM-bound questions in {report['clusters']} clusters", ""]
+    cumulative = 0.0
+    for rank, c in enumerate(report["top_clusters"][:top], 1):
+        cumulative += c["share"]
+        lines.append(f"{rank:>3}. {c['size']:>6} {c['share']:6.1%} (cum {cumulative:6.1%})  {c['representative'][:70]}")
+    for n in (10, 50, 100, 300):
+        if n < len(report["top_clusters"]):
+            share = sum(c["share"] for c in report["top_clusters"][:n])
+            lines.append(f"Top {n} clusters cover {share:.1%} of traffic")
+    lines += [
+        "",
+        f"Served from cache: {report['served_from_cache']} ({report['served_from_cache'] / total:.1%})",
+        f"Projected LLM calls avoided: {report['llm_calls_avoided']} "
+        f"(after {report['clusters']} one-time pre-build calls, {report['cached']} answers cached, "
+        f"{report['failed']} failed)",
+    ]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the pre-answered question cache from a traffic log.")
+    parser.add_argument("log", help="JSONL log of incoming questions")
+    parser.add_argument("--field", default="body", help="JSON key holding the question text")
+    parser.add_argument("-k", type=int, default=300, help="number of clusters")
+    parser.add_argument("--chunk-size", type=int, default=2048)
+    parser.add_argument("--threshold", type=float, default=ANSWER_CACHE_THRESHOLD)
+    parser.add_argument("--out", default=ANSWER_CACHE_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="report only; no LLM calls, nothing written")
+    args = parser.parse_args()
+
+    from app.lifespan import kb
+    from app.prayers import load_prayer_times_csv
+
+    kb.load_kb_text()
+    load_prayer_times_csv()
+    cache, report = build_answer_cache(
+        args.log, args.k, args.field, args.chunk_size, args.threshold, answer=not args.dry_run
+    )
+    print(format_report(report))
+    if not args.dry_run:
+        cache.save(args.out)
+        print(f"\nWrote {len(cache.answers)} answers to {args.out}")
@@ -9,6 +9,7 @@ class KnowledgeBase:
     def __init__(self):
         self.kb_text = ""
         self.kb_files = []
+        self.paragraphs = []
     
     def load_kb_text(self, path_pattern="kb/*.md"):
         """
@@ -34,6 +35,7 @@ class KnowledgeBase:
                 raise IOError(f"Error reading file {fp}: {e}")
         
         self.kb_text = "\n\n".join(parts)
+        self.paragraphs = [p for p in self.kb_text.split("\n\n") if p.strip()]
     
     def _preprocess_query(self, query: str):
         """
@@ -56,16 +58,36 @@ class KnowledgeBase:
             paragraphs (list): List of paragraph strings.
         
         Returns:
-            list: Sorted list of (score, paragraph) tuples, descending by score.
+            list: Sorted list of (score, paragraph, index) tuples, descending by score.
         """
         scored = []
-        for p in paragraphs:
+        for i, p in enumerate(paragraphs):
             score = sum(p.lower().count(t) for t in terms)
             if score > 0:
-                scored.append((score, p))
-        scored.sort(reverse=True)
+                scored.append((score, p, i))
+        scored.sort(key=lambda s: (s[0], s[1]), reverse=True)
         return scored
     
+    def rank_paragraph_ids(self, query: str, k=6):
+        """
+        Ranks paragraphs for a query; retrieve_context_keyword() is built on this ranking.
+        
+        Args:
+            query (str): The search query.
+            k (int): Number of paragraph ids to return (default: 6).
+        
+        Returns:
+            list: Indices into self.paragraphs, best match first.
+        
+        Raises:
+            ValueError: If KB text is not loaded.
+        """
+        if not self.kb_text:
+            raise ValueError("Knowledge base text not loaded. Call load_kb_text() first.")
+        
+        scored = self._score_paragraphs(self._preprocess_query(query), self.paragraphs)
+        return [i for _, _, i in scored[:k]]
+    
     def retrieve_context_keyword(self, query: str, max_chars=2200, debug=False) -> str:
         """
         Retrieves relevant context from the KB based on keyword matching.
@@ -81,14 +103,8 @@ class KnowledgeBase:
         Raises:
             ValueError: If KB text is not loaded.
         """
-        if not self.kb_text:
-            raise ValueError("Knowledge base text not loaded. Call load_kb_text() first.")
-        
-        terms = self._preprocess_query(query)
-        paragraphs = [p for p in self.kb_text.split("\n\n") if p.strip()]
-        scored = self._score_paragraphs(terms, paragraphs)
-        
-        result = "\n\n---\n\n".join(p for _, p in scored[:6])[:max_chars]
+        ids = self.rank_paragraph_ids(query, k=6)
+        result = "\n\n---\n\n".join(self.paragraphs[i] for i in ids)[:max_chars]
         if debug:
             print(result)
         return result
@@ -1,10 +1,29 @@
-from contextlib import asynccontextmanager
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, suppress
+from app.answer_cache import ANSWER_CACHE_PATH, AnswerCache
 from app.kb import KnowledgeBase
 from app.prayers import load_prayer_times_csv
+from app.shadow import ShadowRunner
 
 # Global instance for the knowledge base
 kb = KnowledgeBase()
+# Pre-built answers, optional: built offline by `python -m app.answer_cache`
+answer_cache = AnswerCache()
+# Candidate retrievers compared against production on sampled traffic
+shadow = ShadowRunner(kb)
 LAST_ERROR = ""
+# Recent event-loop lag samples as (time.monotonic(), ms late a 100 ms sleep woke up)
+LOOP_LAG_MS = deque(maxlen=100)
+
+async def monitor_loop_lag(interval=0.1):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG_MS.append((time.monotonic(), (loop.time() - start - interval) * 1000))
 
 @asynccontextmanager
 async def lifespan(app):
@@ -12,6 +31,12 @@ async def lifespan(app):
     try:
         kb.load_kb_text()
         load_prayer_times_csv()
+        if os.path.exists(ANSWER_CACHE_PATH):
+            answer_cache.load(kb_text=kb.kb_text)
     except Exception as e:
         LAST_ERROR = repr(e)
-    yield
\ No newline at end of file
+    lag_task = asyncio.create_task(monitor_loop_lag())
+    yield
+    lag_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await lag_task
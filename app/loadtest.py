@@ -0,0 +1,348 @@
+"""
+End-to-end load test for the WhatsApp webhook.
+
+Starts a fake OpenAI-compatible server and the real app under uvicorn with
+1, 2 and 4 workers. For each worker count it drives POST /whatsapp with
+Twilio-shaped form posts at increasing open-loop (Poisson) arrival rates.
+It reports throughput, latency percentiles, error rate and event-loop lag
+per rate, and the saturation point:
+
+    python -m app.loadtest run --workers 1,2,4 --rates 60,240,960,1920,3840
+
+The fake server can also be run on its own:
+
+    FAKE_OPENAI_LATENCY_MS=800 FAKE_OPENAI_ERROR_RATE=0.02 \\
+        python -m uvicorn app.loadtest:fake_openai --port 8001
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+FAKE_OPENAI_LATENCY_MS = float(os.getenv("FAKE_OPENAI_LATENCY_MS", "800"))
+# Log-normal spread of the fake latency; 0 gives a fixed delay.
+FAKE_OPENAI_LATENCY_SIGMA = float(os.getenv("FAKE_OPENAI_LATENCY_SIGMA", "0.5"))
+FAKE_OPENAI_ERROR_RATE = float(os.getenv("FAKE_OPENAI_ERROR_RATE", "0.01"))
+
+# Twilio gives up on a webhook after 15 seconds.
+TWILIO_TIMEOUT = 15.0
+ERROR_REPLY = "Sorry — the bot hit an error"
+
+SAMPLE_QUESTIONS = [
+    "Where do I park for taraweeh?",
+    "Is there parking at Rosewood for jumuah?",
+    "How do I pay zakat al-fitr?",
+    "What programs do you have for kids during Ramadan?",
+    "Is there childcare during taraweeh?",
+    "Can I volunteer for community iftar?",
+    "How do I book the hall for a nikah?",
+    "What time is maghrib today?",
+    "fajr tomorrow",
+    "iftar time",
+    "Do you accept donations by check?",
+    "Who do I contact about the youth halaqa?",
+]
+
+fake_openai = FastAPI()
+
+
+@fake_openai.post("/v1/chat/completions")
+async def fake_chat_completions(payload: dict):
+    median = FAKE_OPENAI_LATENCY_MS / 1000
+    delay = random.lognormvariate(np.log(median), FAKE_OPENAI_LATENCY_SIGMA) if FAKE_OPENAI_LATENCY_SIGMA else median
+    await asyncio.sleep(delay)
+    if random.random() < FAKE_OPENAI_ERROR_RATE:
+        return JSONResponse(
+            {"error": {"message": "fake upstream error", "type": "server_error", "code": None}}, status_code=500
+        )
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get("model", "gpt-4o-mini"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "Please check the MCC website for details."},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 500, "completion_tokens": 12, "total_tokens": 512},
+    }
+
+
+def twilio_form(body: str) -> dict:
+    """
+    Form fields Twilio sends to a WhatsApp webhook for an inbound text message.
+    """
+    number = f"+1925{random.randint(0, 9999999):07d}"
+    return {
+        "SmsMessageSid": f"SM{uuid.uuid4().hex}",
+        "NumMedia": "0",
+        "ProfileName": "Load Test",
+        "MessageType": "text",
+        "SmsSid": f"SM{uuid.uuid4().hex}",
+        "WaId": number[1:],
+        "SmsStatus": "received",
+        "Body": body,
+        "To": "whatsapp:+14155238886",
+        "NumSegments": "1",
+        "ReferralNumMedia": "0",
+        "MessageSid": f"SM{uuid.uuid4().hex}",
+        "AccountSid": f"AC{uuid.uuid4().hex}",
+        "From": f"whatsapp:{number}",
+        "ApiVersion": "2010-04-01",
+    }
+
+
+async def _send(client, url, question, results):
+    start = time.perf_counter()
+    try:
+        resp = await client.post(url, data=twilio_form(question))
+        ok = resp.status_code == 200 and ERROR_REPLY not in resp.text
+    except httpx.HTTPError:
+        ok = False
+    results.append((ok, start, time.perf_counter()))
+
+
+async def _client_lag(samples, interval=0.05):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - start - interval) * 1000)
+
+
+async def _server_lag(client, base_url, samples, interval=0.25):
+    """
+    Polls /loop-lag and merges each worker's raw samples into samples[(pid, t)] = lag_ms.
+
+    Every uvicorn worker keeps its own recent samples; repeated polls reach every
+    worker over a step, and keying by (pid, timestamp) avoids counting a sample twice.
+    """
+    while True:
+        try:
+            data = (await client.get(f"{base_url}/loop-lag", timeout=TWILIO_TIMEOUT)).json()
+            for t, lag in data.get("recent", []):
+                samples[(data["pid"], t)] = lag
+        except (httpx.HTTPError, ValueError, KeyError):
+            pass
+        await asyncio.sleep(interval)
+
+
+def _percentile_ms(latencies, q):
+    return round(float(np.percentile(latencies, q)) * 1000, 1) if len(latencies) else None
+
+
+async def run_step(base_url, rate_rpm, duration, questions, seed=0):
+    """
+    Sends open-loop Poisson arrivals at one rate and measures the responses.
+
+    Requests are fired on schedule whether or not earlier ones have finished,
+    so a saturated server shows up as growing latency instead of a slower sender.
+
+    Args:
+        base_url (str): App under test, e.g. "http://127.0.0.1:8000".
+        rate_rpm (float): Offered load in requests per minute.
+        duration (float): Seconds of arrivals.
+        questions (list): Message bodies to sample from.
+        seed (int): Random seed for arrivals and questions (default: 0).
+
+    Returns:
+        dict: Offered and achieved rate, latency percentiles, error rate and loop lag.
+    """
+    rng = random.Random(seed)
+    results, client_lag, server_lag = [], [], {}
+    step_start = time.perf_counter()
+    # /loop-lag timestamps are time.monotonic() in the server processes on this host.
+    step_start_monotonic = time.monotonic()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    async with httpx.AsyncClient(timeout=TWILIO_TIMEOUT, limits=limits) as client:
+        monitors = [
+            asyncio.create_task(_client_lag(client_lag)),
+            asyncio.create_task(_server_lag(client, base_url, server_lag)),
+        ]
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tasks = []
+        at = rng.expovariate(rate_rpm / 60)
+        while at < duration:
+            delay = start + at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(_send(client, f"{base_url}/whatsapp", rng.choice(questions), results)))
+            at += rng.expovariate(rate_rpm / 60)
+        await asyncio.gather(*tasks)
+        for m in monitors:
+            m.cancel()
+
+    ok = np.array([end - begin for good, begin, end in results if good])
+    # Reported only: served load including any backlog drained after the arrival window.
+    elapsed = max(duration, max((end for _, _, end in results), default=step_start) - step_start)
+    lags = [lag for (_, t), lag in server_lag.items() if t >= step_start_monotonic]
+    return {
+        "offered_rpm": rate_rpm,
+        "sent": len(results),
+        "arrival_rpm": round(len(results) / duration * 60, 1),
+        "throughput_rpm": round(len(ok) / elapsed * 60, 1),
+        # Successful replies per minute of arrivals; equals arrival_rpm when nothing fails.
+        "goodput_rpm": round(len(ok) / duration * 60, 1),
+        "p50_ms": _percentile_ms(ok, 50),
+        "p95_ms": _percentile_ms(ok, 95),
+        "p99_ms": _percentile_ms(ok, 99),
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else 0.0,
+        "server_lag_p95_ms": round(float(np.percentile(lags, 95)), 1) if lags else None,
+        "server_lag_max_ms": round(max(lags), 1) if lags else None,
+        "lag_workers_seen": len({pid for (pid, t) in server_lag if t >= step_start_monotonic}),
+        "client_lag_max_ms": round(max(client_lag), 1) if client_lag else None,
+    }
+
+
+def is_saturated(step, slo_ms, max_error_rate):
+    """
+    A step is saturated when p95 latency exceeds the SLO or the share of requests
+    sent that did not succeed (errors and timeouts) exceeds the allowed rate.
+
+    An open-loop overload shows up as rising latency and then timeouts, both measured
+    per request, so no rates over different windows are compared here.
+    """
+    return (
+        step["p95_ms"] is None
+        or step["p95_ms"] > slo_ms
+        or step["error_rate"] > max_error_rate
+    )
+
+
+def _start_server(args, env, port):
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", *args, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.STDOUT,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn {' '.join(args)} exited with code {proc.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"uvicorn {' '.join(args)} did not start on port {port}")
+
+
+def _stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def sweep(workers, rates, duration, questions, args):
+    """
+    Runs the rate sweep against the app with the given number of uvicorn workers.
+
+    Returns:
+        tuple: (list of step dicts, saturation rate in rpm or None).
+    """
+    env = dict(os.environ, OPENAI_API_KEY="sk-loadtest", OPENAI_BASE_URL=f"http://127.0.0.1:{args.openai_port}/v1")
+    app = _start_server(["app.main:app", "--workers", str(workers)], env, args.port)
+    steps, saturation = [], None
+    try:
+        for i, rate in enumerate(rates):
+            step = asyncio.run(run_step(f"http://127.0.0.1:{args.port}", rate, duration, questions, seed=i))
+            step["workers"] = workers
+            steps.append(step)
+            print(format_step(step), flush=True)
+            if is_saturated(step, args.slo_ms, args.max_error_rate):
+                saturation = rate
+                break
+    finally:
+        _stop_server(app)
+    return steps, saturation
+
+
+def format_step(step):
+    fmt = lambda v: "-" if v is None else v
+    return (
+        f"  {step['offered_rpm']:>7.0f} rpm offered  {step['goodput_rpm']:>8.1f} rpm ok "
+        f"({step['throughput_rpm']:.1f} incl. drain)  "
+        f"p50 {fmt(step['p50_ms']):>7} p95 {fmt(step['p95_ms']):>7} p99 {fmt(step['p99_ms']):>7} ms  "
+        f"err {step['error_rate']:6.1%}  loop lag p95 {fmt(step['server_lag_p95_ms'])} "
+        f"max {fmt(step['server_lag_max_ms'])} ms, workers seen {step['lag_workers_seen']}"
+    )
+
+
+def load_questions(path, field="body"):
+    with open(path, encoding="utf-8") as f:
+        return [q for q in (json.loads(line).get(field) for line in f if line.strip()) if q]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the WhatsApp webhook against a fake OpenAI server.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="sweep arrival rates for each worker count")
+    run.add_argument("--workers", default="1,2,4", help="comma-separated uvicorn worker counts")
+    run.add_argument("--rates", default="60,120,240,480,960,1920,3840", help="comma-separated requests/minute")
+    run.add_argument("--duration", type=float, default=30, help="seconds per rate step")
+    run.add_argument("--questions", help="JSONL log to sample message bodies from")
+    run.add_argument("--field", default="body", help="JSON key holding the question text")
+    run.add_argument("--slo-ms", type=float, default=5000, help="p95 latency above which a step is saturated")
+    run.add_argument("--max-error-rate", type=float, default=0.01)
+    run.add_argument("--latency-ms", type=float, default=FAKE_OPENAI_LATENCY_MS, help="fake OpenAI median latency")
+    run.add_argument("--latency-sigma", type=float, default=FAKE_OPENAI_LATENCY_SIGMA)
+    run.add_argument("--error-rate", type=float, default=FAKE_OPENAI_ERROR_RATE, help="fake OpenAI error rate")
+    run.add_argument("--port", type=int, default=8000)
+    run.add_argument("--openai-port", type=int, default=8001)
+    run.add_argument("--csv", help="write every step to this CSV file")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions, args.field) if args.questions else SAMPLE_QUESTIONS
+    rates = [float(r) for r in args.rates.split(",")]
+    fake_env = dict(
+        os.environ,
+        FAKE_OPENAI_LATENCY_MS=str(args.latency_ms),
+        FAKE_OPENAI_LATENCY_SIGMA=str(args.latency_sigma),
+        FAKE_OPENAI_ERROR_RATE=str(args.error_rate),
+    )
+    fake = _start_server(["app.loadtest:fake_openai"], fake_env, args.openai_port)
+    all_steps, summary = [], []
+    try:
+        for workers in [int(w) for w in args.workers.split(",")]:
+            print(f"\n{workers} worker(s)")
+            steps, saturation = sweep(workers, rates, args.duration, questions, args)
+            all_steps += steps
+            healthy = [s for s in steps if not is_saturated(s, args.slo_ms, args.max_error_rate)]
+            sustained = max((s["goodput_rpm"] for s in healthy), default=0)
+            peak = max([sustained] + [s["throughput_rpm"] for s in steps if s not in healthy])
+            summary.append((workers, saturation, sustained, peak))
+    finally:
+        _stop_server(fake)
+
+    # Sustained: best goodput of a step that met the SLO.
+    # Peak: also counts saturated steps, at their throughput including the drained backlog.
+    print("\nworkers  saturates at  sustained served  peak served")
+    for workers, saturation, sustained, peak in summary:
+        sat = f"{saturation:.0f} rpm" if saturation else f"> {rates[-1]:.0f} rpm"
+        print(f"{workers:>7}  {sat:>12}  {sustained:>12.0f} rpm  {peak:>7.0f} rpm")
+
+    if args.csv and all_steps:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["workers", *[k for k in all_steps[0] if k != "workers"]])
+            writer.writeheader()
+            writer.writerows(all_steps)
@@ -1,5 +1,6 @@
+import os
 from fastapi import FastAPI
-from app.lifespan import lifespan
+from app.lifespan import LOOP_LAG_MS, lifespan, shadow
 from app.whatsapp import router as whatsapp_router
 
 app = FastAPI(lifespan=lifespan)
@@ -8,4 +9,24 @@ app = FastAPI(lifespan=lifespan)
 def health():
     return {"status": "ok"}
 
+@app.get("/shadow")
+def shadow_summary():
+    return shadow.summary()
+
+@app.get("/loop-lag")
+async def loop_lag():
+    # Per worker process; "recent" lets a caller merge raw samples across workers.
+    recent = list(LOOP_LAG_MS)
+    samples = sorted(lag for _, lag in recent)
+    if not samples:
+        return {"pid": os.getpid(), "samples": 0, "recent": []}
+    return {
+        "pid": os.getpid(),
+        "samples": len(samples),
+        "p50_ms": round(samples[len(samples) // 2], 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95)], 2),
+        "max_ms": round(samples[-1], 2),
+        "recent": [[round(t, 3), round(lag, 2)] for t, lag in recent],
+    }
+
 app.include_router(whatsapp_router)
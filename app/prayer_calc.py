@@ -0,0 +1,287 @@
+"""
+Astronomical prayer-time engine for MCC East Bay.
+
+Computes fajr, sunrise, zuhr, asr, maghrib and isha for a whole year in one
+batched NumPy computation (solar position per day and per prayer), so dates
+outside kb/daily_prayer_times.csv still get an answer. Each year is computed
+once and cached as a compact (days x prayers) array of local minutes.
+"""
+
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+MCC_LATITUDE = 37.6993
+MCC_LONGITUDE = -121.8787
+MCC_TIMEZONE = "America/Los_Angeles"
+
+PRAYER_NAMES = ("fajr", "sunrise", "zuhr", "asr", "maghrib", "isha")
+
+# Twilight angles for fajr/isha. An isha value given as "90 min" is minutes after maghrib.
+# "asr" is the shadow factor (1 standard, 2 Hanafi); "offsets" are minutes added per prayer.
+# MCC is ISNA angles with Hanafi asr and the zuhr/maghrib margins of the published timetable.
+CALC_METHODS = {
+    "MCC": {"fajr": 15.0, "isha": 15.0, "asr": 2, "offsets": {"zuhr": 4, "maghrib": 3}},
+    "ISNA": {"fajr": 15.0, "isha": 15.0},
+    "MWL": {"fajr": 18.0, "isha": 17.0},
+    "Egypt": {"fajr": 19.5, "isha": 17.5},
+    "Makkah": {"fajr": 18.5, "isha": "90 min"},
+    "Karachi": {"fajr": 18.0, "isha": 18.0},
+}
+
+# Configured via env, same as the OpenAI settings.
+CALC_METHOD = os.getenv("PRAYER_CALC_METHOD", "MCC")
+ASR_METHOD = os.getenv("PRAYER_ASR_METHOD", "").lower()
+
+# Sun's upper limb plus standard refraction at sunrise/sunset.
+_HORIZON_ANGLE = 0.833
+
+# The low-precision solar formulas above are good to well under a minute within this range.
+MIN_YEAR = 1900
+MAX_YEAR = 2100
+
+# year -> int16 array of shape (days_in_year, len(PRAYER_NAMES)), minutes after local midnight
+_TIMETABLE_CACHE = {}
+
+
+def _sun_position(jd):
+    """
+    Returns (declination in degrees, equation of time in hours) for Julian dates.
+
+    Args:
+        jd (np.ndarray): Julian dates, any shape.
+
+    Returns:
+        tuple: Two arrays with the same shape as jd.
+    """
+    d = jd - 2451545.0
+    g = np.radians((357.529 + 0.98560028 * d) % 360)
+    q = (280.459 + 0.98564736 * d) % 360
+    lam = np.radians((q + 1.915 * np.sin(g) + 0.020 * np.sin(2 * g)) % 360)
+    e = np.radians(23.439 - 0.00000036 * d)
+
+    ra = np.degrees(np.arctan2(np.cos(e) * np.sin(lam), np.cos(lam))) / 15
+    decl = np.degrees(np.arcsin(np.sin(e) * np.sin(lam)))
+    eqt = q / 15 - ((ra + 24) % 24)
+    eqt = (eqt + 12) % 24 - 12
+    return decl, eqt
+
+
+def _hour_angle(angle, decl, lat):
+    """
+    Hours between solar noon and the moment the sun is `angle` degrees below the horizon.
+
+    Args:
+        angle (np.ndarray | float): Depression angle in degrees.
+        decl (np.ndarray): Solar declination in degrees.
+        lat (float): Latitude in degrees.
+
+    Returns:
+        np.ndarray: Hour angles; NaN where the sun never reaches that angle.
+    """
+    phi, delta = np.radians(lat), np.radians(decl)
+    cos_h = (-np.sin(np.radians(angle)) - np.sin(phi) * np.sin(delta)) / (np.cos(phi) * np.cos(delta))
+    with np.errstate(invalid="ignore"):
+        return np.degrees(np.arccos(cos_h)) / 15
+
+
+def _asr_angle(decl, lat, factor):
+    """
+    Depression angle of the sun when an object's shadow is `factor` times its length plus the noon shadow.
+    """
+    alt = np.arctan(1 / (factor + np.tan(np.radians(np.abs(lat - decl)))))
+    return -np.degrees(alt)
+
+
+def _utc_offsets(days, tz):
+    """
+    UTC offset in hours at local noon for each date, so DST is applied per day.
+    """
+    zone = ZoneInfo(tz)
+    return np.array(
+        [datetime(d.year, d.month, d.day, 12, tzinfo=zone).utcoffset().total_seconds() / 3600 for d in days]
+    )
+
+
+def _compute_local_hours(days, lat, lng, tz, params, asr_factor, iterations):
+    """
+    Fractional local clock hours for each date and prayer, before adjustments and rounding.
+    """
+    isha_minutes = None
+    isha_angle = params["isha"]
+    if isinstance(isha_angle, str):
+        isha_minutes = float(isha_angle.split()[0])
+        isha_angle = _HORIZON_ANGLE
+
+    ordinals = np.array([d.toordinal() for d in days], dtype=np.float64)
+    # date.toordinal() of 2000-01-01 is 730120; JD 2451544.5 is that midnight UTC.
+    jd0 = ordinals - 730120 + 2451544.5 - lng / 360
+
+    # Side of solar noon for each prayer, and its depression angle (asr is filled per pass).
+    sign = np.array([-1, -1, 0, 1, 1, 1], dtype=np.float64)
+    angles = np.array([params["fajr"], _HORIZON_ANGLE, 0, 0, _HORIZON_ANGLE, isha_angle], dtype=np.float64)
+
+    # Initial guesses in local solar hours, refined by evaluating the sun at each guess.
+    # Fajr and isha take the sun at solar noon instead, as the published MCC timetable does.
+    hours = np.broadcast_to(np.array([5, 6, 12, 13, 18, 18], dtype=np.float64), (len(days), 6)).copy()
+    for _ in range(max(iterations, 1)):
+        jd = jd0[:, None] + hours / 24
+        jd[:, [0, 5]] = jd[:, 2:3]
+        decl, eqt = _sun_position(jd)
+        noon = 12 - eqt
+        a = np.broadcast_to(angles, hours.shape).copy()
+        a[:, 3] = _asr_angle(decl[:, 3], lat, asr_factor)
+        hours = noon + sign * _hour_angle(a, decl, lat)
+        hours[:, 2] = noon[:, 2]
+
+    if isha_minutes is not None:
+        hours[:, 5] = hours[:, 4] + isha_minutes / 60
+
+    return hours - lng / 15 + _utc_offsets(days, tz)[:, None]
+
+
+def compute_prayer_minutes(
+    days,
+    lat=MCC_LATITUDE,
+    lng=MCC_LONGITUDE,
+    tz=MCC_TIMEZONE,
+    method=None,
+    asr_factor=None,
+    iterations=2,
+):
+    """
+    Computes prayer times for a batch of dates in one vectorized pass.
+
+    Args:
+        days (list[date]): Dates to compute.
+        lat (float): Latitude in degrees (default: MCC East Bay).
+        lng (float): Longitude in degrees, east positive (default: MCC East Bay).
+        tz (str): IANA timezone used for local times (default: America/Los_Angeles).
+        method (str): Key of CALC_METHODS (default: PRAYER_CALC_METHOD env or MCC).
+        asr_factor (int): 1 for standard, 2 for Hanafi (default: PRAYER_ASR_METHOD env, else the method's).
+        iterations (int): Refinement passes re-evaluating the sun at each prayer's time (default: 2).
+
+    Returns:
+        np.ndarray: int16 array of shape (len(days), 6), minutes after local midnight,
+        columns ordered as PRAYER_NAMES. -1 where a time is undefined.
+
+    Raises:
+        ValueError: If the calculation method is unknown.
+    """
+    method = method or CALC_METHOD
+    if method not in CALC_METHODS:
+        raise ValueError(f"Unknown prayer calculation method: {method}")
+    params = CALC_METHODS[method]
+    if not asr_factor:
+        asr_factor = {"standard": 1, "hanafi": 2}.get(ASR_METHOD, params.get("asr", 1))
+
+    hours = _compute_local_hours(days, lat, lng, tz, params, asr_factor, iterations)
+    offsets = np.array([params.get("offsets", {}).get(n, 0) for n in PRAYER_NAMES], dtype=np.float64)
+    # Rounded up, as published timetables do, so no prayer is shown before its time.
+    minutes = np.ceil(hours * 60 + offsets)
+    return np.where(np.isnan(minutes), -1, minutes).astype(np.int16)
+
+
+def get_year_timetable(year: int) -> np.ndarray:
+    """
+    Returns the cached timetable for a year, computing it on first use.
+
+    Args:
+        year (int): Calendar year.
+
+    Returns:
+        np.ndarray: int16 array of shape (days_in_year, 6), see compute_prayer_minutes().
+    """
+    table = _TIMETABLE_CACHE.get(year)
+    if table is None:
+        start = date(year, 1, 1)
+        n = (date(year + 1, 1, 1) - start).days
+        table = compute_prayer_minutes([start + timedelta(days=i) for i in range(n)])
+        _TIMETABLE_CACHE[year] = table
+    return table
+
+
+def format_minutes(m: int) -> str:
+    """
+    Formats minutes after midnight like the CSV does (e.g. 365 -> "6:05 AM").
+    """
+    h, mm = divmod(int(m), 60)
+    return f"{(h % 12) or 12}:{mm:02d} {'AM' if h % 24 < 12 else 'PM'}"
+
+
+def computed_prayer_row(iso_date: str):
+    """
+    Returns a computed row for a date in the same shape as a kb/daily_prayer_times.csv row.
+
+    Args:
+        iso_date (str): Date as YYYY-MM-DD.
+
+    Returns:
+        dict | None: Row keyed by lowercase CSV column, or None for an invalid date
+        or a year outside MIN_YEAR..MAX_YEAR.
+    """
+    try:
+        d = date.fromisoformat(iso_date)
+    except ValueError:
+        return None
+    if not MIN_YEAR <= d.year <= MAX_YEAR:
+        return None
+    mins = get_year_timetable(d.year)[d.timetuple().tm_yday - 1]
+    row = {"date": iso_date, "day": d.strftime("%a"), "timezone": MCC_TIMEZONE}
+    for name, m in zip(PRAYER_NAMES, mins):
+        if m >= 0:
+            row[name] = format_minutes(m)
+    return row
+
+
+def _parse_clock(value: str) -> int:
+    t = datetime.strptime(value.strip(), "%I:%M %p")
+    return t.hour * 60 + t.minute
+
+
+def validate_against_csv(rows: dict, tolerance=1):
+    """
+    Compares computed times with published rows.
+
+    Args:
+        rows (dict): Date -> row mapping, as loaded into app.prayers.PRAYER_TIMES.
+        tolerance (int): Allowed difference in minutes (default: 1).
+
+    Returns:
+        list: (date, prayer, published, computed) tuples outside the tolerance.
+    """
+    mismatches = []
+    for d, row in sorted(rows.items()):
+        computed = computed_prayer_row(d)
+        if not computed:
+            continue
+        for name in PRAYER_NAMES:
+            if not row.get(name) or name not in computed:
+                continue
+            if abs(_parse_clock(row[name]) - _parse_clock(computed[name])) > tolerance:
+                mismatches.append((d, name, row[name], computed[name]))
+    return mismatches
+
+
+# Validation against the published CSV plus a full-year generation benchmark.
+if __name__ == "__main__":
+    from app import prayers
+
+    prayers.load_prayer_times_csv()
+    bad = validate_against_csv(prayers.PRAYER_TIMES)
+    total = len(prayers.PRAYER_TIMES) * len(PRAYER_NAMES)
+    print(f"{total - len(bad)}/{total} CSV times within ±1 min (method {CALC_METHOD})")
+    for m in bad[:20]:
+        print("  mismatch:", *m)
+
+    runs = 50
+    start = time.perf_counter()
+    for i in range(runs):
+        _TIMETABLE_CACHE.clear()
+        get_year_timetable(2000 + i)
+    print(f"Generated one year in {(time.perf_counter() - start) / runs * 1000:.2f} ms (avg of {runs})")
+    sys.exit(1 if bad else 0)
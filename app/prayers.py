@@ -1,6 +1,7 @@
 import csv
 from datetime import date, timedelta, datetime
 import re
+from app.prayer_calc import computed_prayer_row
 
 PRAYER_TIMES = {}
 
@@ -12,6 +13,13 @@ def load_prayer_times_csv(path="kb/daily_prayer_times.csv"):
         for row in reader:
             PRAYER_TIMES[row["date"]] = {k.lower(): v for k, v in row.items()}
 
+def get_prayer_row(d: str):
+    """Computed times for a date, with any published CSV row taking precedence."""
+    row = computed_prayer_row(d)
+    if d in PRAYER_TIMES:
+        row = {**(row or {}), **{k: v for k, v in PRAYER_TIMES[d].items() if v}}
+    return row
+
 def check_prayer_time_shortcuts(msg: str):
     msg = msg.lower()
     today = date.today().isoformat()
@@ -24,7 +32,7 @@ def check_prayer_time_shortcuts(msg: str):
     if hyphen_match:
         a, b, year = hyphen_match.groups()
         a, b = int(a), int(b)
-        year = int(year) if year else 2026
+        year = int(year) if year else date.today().year
         # Try DD-MM first if a > 12 (likely day), else MM-DD
         if a > 12 and b <= 12:
             day, month = a, b
@@ -56,7 +64,7 @@ def check_prayer_time_shortcuts(msg: str):
         if day_month_match:
             day_str, month_str, year_str = day_month_match.groups()
             day = int(day_str)
-            year = int(year_str) if year_str else 2026
+            year = int(year_str) if year_str else date.today().year
             try:
                 # Try full month name
                 month = datetime.strptime(month_str, "%B").month
@@ -74,7 +82,7 @@ def check_prayer_time_shortcuts(msg: str):
             if month_day_match:
                 month_str, day_str, year_str = month_day_match.groups()
                 day = int(day_str)
-                year = int(year_str) if year_str else 2026
+                year = int(year_str) if year_str else date.today().year
                 try:
                     month = datetime.strptime(month_str, "%B").month
                     parsed_date = datetime(year, month, day).date().isoformat()
@@ -99,7 +107,7 @@ def check_prayer_time_shortcuts(msg: str):
                     pass  # Invalid date for current month (e.g., Feb 30)
 
     d = parsed_date if parsed_date else (tomorrow if "tomorrow" in msg else today)
-    row = PRAYER_TIMES.get(d)
+    row = get_prayer_row(d)
     if not row:
         return f"No prayer times available for {d}."
 
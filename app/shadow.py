@@ -0,0 +1,263 @@
+"""
+Shadow-mode comparison of candidate retrievers against production.
+
+Production retrieval (KnowledgeBase.retrieve_context_keyword) still answers
+every request. For a sampled fraction of requests, the query is handed to a
+small background executor that recomputes the production ranking and runs
+each candidate retriever, recording top-k paragraph ids, overlap with
+production and latency. When the executor is saturated the sample is dropped,
+so the webhook never waits on shadow work.
+
+Summaries are served at GET /shadow, or offline with
+`python -m app.shadow QUERIES.jsonl` which replays logged questions.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.answer_cache import vectorize
+
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+SHADOW_MAX_WORKERS = int(os.getenv("SHADOW_MAX_WORKERS", "1"))
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "16"))
+SHADOW_CANDIDATES = [c for c in os.getenv("SHADOW_CANDIDATES", "ngram,bm25").split(",") if c]
+# Optional JSONL file receiving one record per shadowed query.
+SHADOW_LOG_PATH = os.getenv("SHADOW_LOG_PATH", "")
+
+TOP_K = 6
+
+# (retriever name, kb_text) -> prebuilt index; rebuilt whenever the KB text changes.
+_INDEXES = {}
+
+
+def _index(name, kb, build):
+    key = (name, hash(kb.kb_text))
+    if key not in _INDEXES:
+        if len(_INDEXES) > 8:
+            _INDEXES.clear()
+        _INDEXES[key] = build(kb.paragraphs)
+    return _INDEXES[key]
+
+
+def ngram_retriever(kb, query, k=TOP_K):
+    """
+    Cosine similarity over hashed character n-grams (same vectors as the answer cache).
+    """
+    vectors = _index("ngram", kb, vectorize)
+    sims = vectors @ vectorize([query])[0]
+    top = np.argsort(-sims, kind="stable")[:k]
+    return [int(i) for i in top if sims[i] > 0]
+
+
+def _bm25_index(paragraphs):
+    docs = [Counter(t for t in p.lower().split() if len(t) > 2) for p in paragraphs]
+    df = Counter(t for d in docs for t in d)
+    lengths = np.array([sum(d.values()) for d in docs], dtype=np.float64)
+    idf = {t: math.log(1 + (len(docs) - n + 0.5) / (n + 0.5)) for t, n in df.items()}
+    return docs, idf, lengths / max(lengths.mean(), 1)
+
+
+def bm25_retriever(kb, query, k=TOP_K, k1=1.2, b=0.75):
+    """
+    Okapi BM25 over the same terms production uses (lowercased words longer than 2 chars).
+    """
+    docs, idf, rel_len = _index("bm25", kb, _bm25_index)
+    terms = set(kb._preprocess_query(query)) & idf.keys()
+    if not terms:
+        return []
+    scores = np.zeros(len(docs))
+    for t in terms:
+        tf = np.array([d.get(t, 0) for d in docs], dtype=np.float64)
+        scores += idf[t] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * rel_len))
+    top = np.argsort(-scores, kind="stable")[:k]
+    return [int(i) for i in top if scores[i] > 0]
+
+
+CANDIDATE_RETRIEVERS = {
+    "ngram": ngram_retriever,
+    "bm25": bm25_retriever,
+}
+
+
+def _overlap(prod, cand):
+    if not prod:
+        return 1.0 if not cand else 0.0
+    return len(set(prod) & set(cand)) / len(prod)
+
+
+class ShadowRunner:
+    """
+    Runs candidate retrievers off the request path and aggregates their agreement with production.
+    """
+
+    def __init__(
+        self,
+        kb,
+        candidates=SHADOW_CANDIDATES,
+        sample_rate=SHADOW_SAMPLE_RATE,
+        max_workers=SHADOW_MAX_WORKERS,
+        max_pending=SHADOW_MAX_PENDING,
+        log_path=SHADOW_LOG_PATH,
+        history=1000,
+    ):
+        self.kb = kb
+        self.candidates = {name: CANDIDATE_RETRIEVERS[name] for name in candidates}
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.log_path = log_path
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shadow")
+        self.lock = threading.Lock()
+        self.log_lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.dropped = 0
+        self.errors = 0
+        # Recent records only, so memory stays bounded on long-running workers.
+        self.records = deque(maxlen=history)
+
+    def submit(self, query: str, prod_latency: float):
+        """
+        Samples a production query for shadow comparison without blocking.
+
+        Args:
+            query (str): The query production just answered.
+            prod_latency (float): Production retrieval time in seconds.
+        """
+        if not self.candidates or random.random() >= self.sample_rate:
+            return
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self.pending += 1
+            self.submitted += 1
+        self.executor.submit(self._run, query, prod_latency)
+
+    def _run(self, query, prod_latency):
+        try:
+            self.record(self.compare(query, prod_latency))
+        except Exception:
+            with self.lock:
+                self.errors += 1
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def compare(self, query: str, prod_latency=None):
+        """
+        Runs production ranking and every candidate for one query.
+
+        Args:
+            query (str): Search query.
+            prod_latency (float): Measured production latency; timed here if None.
+
+        Returns:
+            dict: Record with production ids and per-candidate ids, overlap and latency.
+        """
+        start = time.perf_counter()
+        prod = self.kb.rank_paragraph_ids(query, TOP_K)
+        if prod_latency is None:
+            prod_latency = time.perf_counter() - start
+
+        record = {"query": query, "production": {"ids": prod, "latency_ms": prod_latency * 1000}, "candidates": {}}
+        for name, retriever in self.candidates.items():
+            start = time.perf_counter()
+            ids = retriever(self.kb, query, TOP_K)
+            record["candidates"][name] = {
+                "ids": ids,
+                "latency_ms": (time.perf_counter() - start) * 1000,
+                "overlap": _overlap(prod, ids),
+                "top1_agree": (prod[:1] == ids[:1]),
+            }
+        return record
+
+    def record(self, record):
+        """
+        Stores a comparison record and appends it to SHADOW_LOG_PATH if set.
+        """
+        with self.lock:
+            self.records.append(record)
+        # Separate lock so disk I/O never holds up submit() on the request path.
+        if self.log_path:
+            with self.log_lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def summary(self):
+        """
+        Aggregates the recent records per retriever.
+
+        Returns:
+            dict: Counters plus, per retriever, sample count, latency p50/p95 and agreement.
+        """
+        with self.lock:
+            records = list(self.records)
+            out = {"submitted": self.submitted, "dropped": self.dropped, "errors": self.errors, "pending": self.pending}
+        out["retrievers"] = summarize(records)
+        return out
+
+
+def summarize(records):
+    """
+    Per-retriever latency and agreement statistics for a list of comparison records.
+    """
+    if not records:
+        return {}
+    prod_lat = np.array([r["production"]["latency_ms"] for r in records])
+    stats = {
+        "production": {"n": len(records), "p50_ms": np.percentile(prod_lat, 50), "p95_ms": np.percentile(prod_lat, 95)}
+    }
+    for name in records[0]["candidates"]:
+        rows = [r["candidates"][name] for r in records if name in r["candidates"]]
+        lat = np.array([c["latency_ms"] for c in rows])
+        stats[name] = {
+            "n": len(rows),
+            "p50_ms": np.percentile(lat, 50),
+            "p95_ms": np.percentile(lat, 95),
+            "mean_overlap": float(np.mean([c["overlap"] for c in rows])),
+            "top1_agreement": float(np.mean([c["top1_agree"] for c in rows])),
+        }
+    return {name: {k: v if k == "n" else round(float(v), 4) for k, v in s.items()} for name, s in stats.items()}
+
+
+def format_summary(stats):
+    """
+    Renders summarize() output as a plain-text table.
+    """
+    lines = [f"{'retriever':<12} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'overlap':>8} {'top1':>6}"]
+    for name, s in stats.items():
+        overlap = f"{s['mean_overlap']:.1%}" if "mean_overlap" in s else "-"
+        top1 = f"{s['top1_agreement']:.1%}" if "top1_agreement" in s else "-"
+        lines.append(f"{name:<12} {s['n']:>6} {s['p50_ms']:>8.3f} {s['p95_ms']:>8.3f} {overlap:>8} {top1:>6}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare candidate retrievers against production.")
+    parser.add_argument("queries", help="JSONL of logged questions, or of shadow records with --records")
+    parser.add_argument("--field", default="body", help="JSON key holding the question text")
+    parser.add_argument("--records", action="store_true", help="summarize an existing SHADOW_LOG_PATH file")
+    parser.add_argument("--candidates", default=",".join(CANDIDATE_RETRIEVERS))
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    if args.records:
+        records = rows
+    else:
+        from app.kb import KnowledgeBase
+
+        kb = KnowledgeBase()
+        kb.load_kb_text()
+        runner = ShadowRunner(kb, candidates=args.candidates.split(","), log_path="")
+        records = [runner.compare(r.get(args.field) or "") for r in rows]
+    print(format_summary(summarize(records)))
@@ -3,6 +3,7 @@ from fastapi.responses import PlainTextResponse
 from twilio.twiml.messaging_response import MessagingResponse
 from app.prayers import check_prayer_time_shortcuts
 from app.ai import answer_with_ai_or_fallback
+from app.lifespan import answer_cache
 from app.utils import clamp_reply
 
 router = APIRouter()
@@ -14,6 +15,8 @@ async def whatsapp(request: Request):
         user_msg = (form.get("Body") or "").strip()
 
         reply = check_prayer_time_shortcuts(user_msg)
+        if not reply:
+            reply = answer_cache.lookup(user_msg)
         if not reply:
             reply = answer_with_ai_or_fallback(user_msg)
 